@@ -0,0 +1,136 @@
+"""Initial schema
+
+Matches the tables the baseline created via Base.metadata.create_all:
+enum columns still use the member-name labels SQLAlchemy emitted by
+default ('PENDING', ...) and document_approvals.external_api_response is
+still TEXT. Databases bootstrapped by the old create_all should be
+stamped with this revision before upgrading.
+
+Revision ID: a3f8c2d41e90
+Revises:
+Create Date: 2026-08-31 10:14:02.518344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8c2d41e90'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+user_type = sa.Enum('STORE', 'DRIVER', name='usertype')
+approval_status = sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='approvalstatus')
+driver_status = sa.Enum('AVAILABLE', 'BUSY', 'OFFLINE', name='driverstatus')
+order_status = sa.Enum('PENDING', 'ASSIGNED', 'IN_PROGRESS', 'DELIVERED', 'CANCELLED', name='orderstatus')
+vehicle_type = sa.Enum('MOTORCYCLE', 'CAR', 'VAN', 'TRUCK', name='vehicletype')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('user_type', user_type, nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'drivers',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('first_name', sa.String(), nullable=False),
+        sa.Column('last_name', sa.String(), nullable=False),
+        sa.Column('phone_number', sa.String(), nullable=False),
+        sa.Column('vehicle_type', vehicle_type, nullable=False),
+        sa.Column('vehicle_plate', sa.String(), nullable=False),
+        sa.Column('vehicle_model', sa.String(), nullable=False),
+        sa.Column('vehicle_year', sa.Integer(), nullable=False),
+        sa.Column('current_latitude', sa.Float(), nullable=True),
+        sa.Column('current_longitude', sa.Float(), nullable=True),
+        sa.Column('last_location_update', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('status', driver_status, nullable=True),
+        sa.Column('approval_status', approval_status, nullable=True),
+        sa.Column('license_document', sa.String(), nullable=True),
+        sa.Column('id_document', sa.String(), nullable=True),
+        sa.Column('documents_submitted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.UniqueConstraint('user_id'),
+    )
+    op.create_index('ix_drivers_id', 'drivers', ['id'])
+
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('store_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('store_name', sa.String(), nullable=False),
+        sa.Column('driver_id', sa.Integer(), sa.ForeignKey('drivers.id'), nullable=True),
+        sa.Column('order_number', sa.String(), nullable=False),
+        sa.Column('customer_name', sa.String(), nullable=False),
+        sa.Column('customer_phone', sa.String(), nullable=False),
+        sa.Column('pickup_address', sa.Text(), nullable=False),
+        sa.Column('pickup_latitude', sa.Float(), nullable=False),
+        sa.Column('pickup_longitude', sa.Float(), nullable=False),
+        sa.Column('pickup_instructions', sa.Text(), nullable=True),
+        sa.Column('delivery_address', sa.Text(), nullable=False),
+        sa.Column('delivery_latitude', sa.Float(), nullable=False),
+        sa.Column('delivery_longitude', sa.Float(), nullable=False),
+        sa.Column('delivery_instructions', sa.Text(), nullable=True),
+        sa.Column('items_description', sa.Text(), nullable=True),
+        sa.Column('weight_kg', sa.Float(), nullable=True),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('status', order_status, nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('assigned_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('picked_up_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('estimated_distance_km', sa.Float(), nullable=True),
+        sa.Column('estimated_duration_minutes', sa.Integer(), nullable=True),
+        sa.UniqueConstraint('order_number'),
+    )
+    op.create_index('ix_orders_id', 'orders', ['id'])
+
+    op.create_table(
+        'order_notifications',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id'), nullable=True),
+        sa.Column('driver_id', sa.Integer(), sa.ForeignKey('drivers.id'), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('response', sa.String(), nullable=True),
+        sa.Column('response_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('distance_km', sa.Float(), nullable=True),
+    )
+    op.create_index('ix_order_notifications_id', 'order_notifications', ['id'])
+
+    op.create_table(
+        'document_approvals',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('driver_id', sa.Integer(), sa.ForeignKey('drivers.id'), nullable=True),
+        sa.Column('sent_to_external_api', sa.Boolean(), nullable=True),
+        sa.Column('external_api_response', sa.Text(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('license_approved', sa.Boolean(), nullable=True),
+        sa.Column('id_document_approved', sa.Boolean(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_document_approvals_id', 'document_approvals', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('document_approvals')
+    op.drop_table('order_notifications')
+    op.drop_table('orders')
+    op.drop_table('drivers')
+    op.drop_table('users')
+    bind = op.get_bind()
+    for enum in (vehicle_type, order_status, driver_status, approval_status, user_type):
+        enum.drop(bind, checkfirst=True)
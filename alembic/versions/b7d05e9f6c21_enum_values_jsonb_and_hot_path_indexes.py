@@ -0,0 +1,97 @@
+"""Enum value labels, JSONB approval responses, hot-path indexes
+
+The models now persist enum .value strings ('pending') instead of the
+member names ('PENDING') SQLAlchemy stored by default, store external
+API responses as JSONB, and declare composite indexes for the
+assignment and listing scans. Renaming the enum labels in place also
+rewrites the stored rows, so existing data keeps reading correctly.
+Pre-existing external_api_response rows are Python dict reprs, not
+valid JSON, so the JSONB conversion carries them over as JSON strings.
+
+Revision ID: b7d05e9f6c21
+Revises: a3f8c2d41e90
+Create Date: 2026-08-31 10:31:47.902216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d05e9f6c21'
+down_revision = 'a3f8c2d41e90'
+branch_labels = None
+depends_on = None
+
+# enum type name -> (old member-name label, new value label)
+_ENUM_RENAMES = {
+    'usertype': [
+        ('STORE', 'store'),
+        ('DRIVER', 'driver'),
+    ],
+    'approvalstatus': [
+        ('PENDING', 'pending'),
+        ('APPROVED', 'approved'),
+        ('REJECTED', 'rejected'),
+    ],
+    'driverstatus': [
+        ('AVAILABLE', 'available'),
+        ('BUSY', 'busy'),
+        ('OFFLINE', 'offline'),
+    ],
+    'orderstatus': [
+        ('PENDING', 'pending'),
+        ('ASSIGNED', 'assigned'),
+        ('IN_PROGRESS', 'in_progress'),
+        ('DELIVERED', 'delivered'),
+        ('CANCELLED', 'cancelled'),
+    ],
+    'vehicletype': [
+        ('MOTORCYCLE', 'motorcycle'),
+        ('CAR', 'car'),
+        ('VAN', 'van'),
+        ('TRUCK', 'truck'),
+    ],
+}
+
+
+def upgrade() -> None:
+    # Label renames on the pg enum types; existing column data follows
+    for enum_name, renames in _ENUM_RENAMES.items():
+        for old, new in renames:
+            op.execute(f"ALTER TYPE {enum_name} RENAME VALUE '{old}' TO '{new}'")
+
+    # Legacy rows hold str(dict) Python reprs (single quotes, True/False),
+    # which ::jsonb would reject. to_jsonb keeps them as JSON strings so
+    # the upgrade succeeds on populated databases; rows written after the
+    # model change arrive as real JSON objects
+    op.execute(
+        "ALTER TABLE document_approvals "
+        "ALTER COLUMN external_api_response TYPE JSONB "
+        "USING CASE WHEN external_api_response IS NULL THEN NULL "
+        "ELSE to_jsonb(external_api_response) END"
+    )
+
+    op.create_index('ix_drivers_status_approval', 'drivers', ['status', 'approval_status'])
+    op.create_index('ix_drivers_location', 'drivers', ['current_latitude', 'current_longitude'])
+    op.create_index('ix_orders_store_status', 'orders', ['store_id', 'status'])
+    op.create_index('ix_orders_driver_status', 'orders', ['driver_id', 'status'])
+    op.create_index('ix_orders_status_created', 'orders', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_status_created', table_name='orders')
+    op.drop_index('ix_orders_driver_status', table_name='orders')
+    op.drop_index('ix_orders_store_status', table_name='orders')
+    op.drop_index('ix_drivers_location', table_name='drivers')
+    op.drop_index('ix_drivers_status_approval', table_name='drivers')
+
+    op.execute(
+        "ALTER TABLE document_approvals "
+        "ALTER COLUMN external_api_response TYPE TEXT "
+        "USING external_api_response::text"
+    )
+
+    for enum_name, renames in _ENUM_RENAMES.items():
+        for old, new in renames:
+            op.execute(f"ALTER TYPE {enum_name} RENAME VALUE '{new}' TO '{old}'")
@@ -3,10 +3,16 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import DATABASE_URL
 
+# Sized for multiple uvicorn workers with threadpool + async traffic;
+# the default 5+10 pool serializes requests on connection checkout.
+# LIFO checkout keeps the working set of connections small under low load.
 engine = create_engine(
     DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
     pool_pre_ping=True,
-    pool_recycle=300
+    pool_recycle=1800,
+    pool_use_lifo=True
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
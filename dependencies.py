@@ -0,0 +1,26 @@
+from functools import lru_cache
+
+from osrm_client import OSRMClient
+from services.assignment_service import DriverAssignmentService
+from services.external_api_service import ExternalAPIService
+from services.file_service import FileService
+
+# lru_cache(maxsize=1) makes each factory a lazy singleton: the instance
+# is built on first request and shared afterwards, while tests can call
+# .cache_clear() or override the dependency to inject a fake.
+
+@lru_cache(maxsize=1)
+def get_osrm_client() -> OSRMClient:
+    return OSRMClient()
+
+@lru_cache(maxsize=1)
+def get_assignment_service() -> DriverAssignmentService:
+    return DriverAssignmentService(get_osrm_client())
+
+@lru_cache(maxsize=1)
+def get_external_api_service() -> ExternalAPIService:
+    return ExternalAPIService()
+
+@lru_cache(maxsize=1)
+def get_file_service() -> FileService:
+    return FileService()
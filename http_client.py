@@ -0,0 +1,25 @@
+import httpx
+from typing import Optional
+
+# Single keepalive HTTP client shared by every outbound integration
+# (OSRM routing, external approval API). Reusing one client means TCP/TLS
+# handshakes are paid once per host, not once per call.
+_async_client: Optional[httpx.AsyncClient] = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """Lazily create the shared app-wide httpx.AsyncClient"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200)
+        )
+    return _async_client
+
+async def aclose():
+    """Close the shared client (called on app shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -1,11 +1,21 @@
+import asyncio
 import os
+import hashlib
+import threading
+import time
 import uvicorn
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect, Query, Form, Request
+from jose import jwt
+import anyio.to_thread
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect, Query, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_, true, false
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func, or_, and_, select, true, false
 from datetime import datetime, timedelta
 from typing import List, Optional
 import os
@@ -14,19 +24,26 @@ import os.path
 import uuid
 
 # Import database and models
-from database import engine, get_db, Base
+from database import engine, get_db
 from models import User as UserModel, Driver as DriverModel, Order as OrderModel, OrderNotification as OrderNotificationModel, UserType, DriverStatus, OrderStatus, ApprovalStatus, Driver
 import schemas
 from auth import get_password_hash, authenticate_user, create_access_token, verify_token, get_current_active_user
 from websocket_manager import manager, handle_websocket_connection
-from services.file_service import file_service
-from services.assignment_service import assignment_service  
-from services.external_api_service import external_api_service
+from services.file_service import FileService
+from services.assignment_service import DriverAssignmentService
+from services.external_api_service import ExternalAPIService
 from osrm_client import OSRMClient
+from dependencies import (
+    get_assignment_service,
+    get_external_api_service,
+    get_file_service,
+    get_osrm_client,
+)
 import config
+import http_client
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema is managed by Alembic (alembic upgrade head before launching
+# uvicorn); no import-time DDL so worker cold starts stay cheap
 
 def generate_order_number(db: Session) -> str:
     """Generate a unique order number with format ORDER-YYYYMMDD-XXXX"""
@@ -50,11 +67,26 @@ def generate_order_number(db: Session) -> str:
     today = datetime.utcnow().strftime("%Y%m%d")
     return f"ORDER-{today}-{sequence:04d}"
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bcrypt hashing/verification runs in the anyio threadpool; the default
+    # 40 tokens is too small when many logins are in flight at once
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+
+    # Warm the connection pool so the first requests don't pay for connects
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+
+    yield
+    await http_client.aclose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="DriverLink Delivery Management System",
     description="Backend API for delivery management with driver assignment and real-time notifications",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -69,10 +101,57 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
+# Keep references to fire-and-forget notification tasks so they aren't
+# garbage-collected mid-flight
+_background_tasks: set = set()
+
+def _spawn_background_task(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# Short-TTL cache for verified tokens so repeated requests skip the HS256
+# decode and the SELECT on users. Keyed by SHA-256 of the raw token; values
+# are (user_id, exp). The 30s TTL bounds how long a revoked/deactivated
+# token keeps working.
+_token_cache = TTLCache(maxsize=10000, ttl=30)
+_token_cache_lock = threading.Lock()
+
 # Dependency to get current user from token
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     token = credentials.credentials
-    return get_current_active_user(db, token)
+    cache_key = hashlib.sha256(token.encode()).digest()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+
+    if cached is not None:
+        user_id, exp = cached
+        # exp is epoch seconds (see create_access_token), so compare
+        # against time.time(); utcnow().timestamp() would reinterpret
+        # the naive datetime in local time
+        if exp is None or exp > time.time():
+            # PK lookup hits the session identity map / PK index, much
+            # cheaper than re-verifying the HMAC + email lookup
+            user = db.get(UserModel, user_id)
+            if user is not None and bool(user.is_active):
+                return user
+        # Token expired or user gone/inactive: drop the stale entry
+        with _token_cache_lock:
+            _token_cache.pop(cache_key, None)
+
+    user = get_current_active_user(db, token)
+
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except Exception:
+        exp = None
+
+    with _token_cache_lock:
+        _token_cache[cache_key] = (user.id, exp)
+
+    return user
 
 # Dependency to check if user is a store
 def get_current_store(current_user: UserModel = Depends(get_current_user)):
@@ -88,7 +167,9 @@ def get_current_driver_user(current_user: UserModel = Depends(get_current_user))
 
 # Dependency to get driver profile
 def get_current_driver(current_user: UserModel = Depends(get_current_driver_user), db: Session = Depends(get_db)):
-    driver = db.query(DriverModel).filter(DriverModel.user_id == current_user.id).first()
+    driver = db.execute(
+        select(DriverModel).where(DriverModel.user_id == current_user.id)
+    ).scalar_one_or_none()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver profile not found")
     return driver
@@ -98,12 +179,14 @@ def get_current_driver(current_user: UserModel = Depends(get_current_driver_user
 async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user (store or driver)"""
     # Check if user already exists
-    db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+    db_user = db.execute(
+        select(UserModel).where(UserModel.email == user.email)
+    ).scalar_one_or_none()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user (bcrypt is CPU-heavy; keep it off the event loop)
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
     db_user = UserModel(
         email=user.email,
         hashed_password=hashed_password,
@@ -118,17 +201,19 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
 @app.post("/auth/login", response_model=schemas.Token)
 async def login_user(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
     """Authenticate user and return JWT token"""
-    user = authenticate_user(db, user_login.email, user_login.password)
+    # Bcrypt verify blocks for ~100-300ms; run it in the threadpool so the
+    # event loop keeps servicing other requests
+    user = await run_in_threadpool(authenticate_user, db, user_login.email, user_login.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+    access_token = await run_in_threadpool(
+        create_access_token, {"sub": user.email}, access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -151,7 +236,9 @@ async def register_driver(
     After successful registration, the user's role will be updated to DRIVER.
     """
     # Check if driver profile already exists
-    existing_driver = db.query(Driver).filter(Driver.user_id == current_user.id).first()
+    existing_driver = db.execute(
+        select(Driver).where(Driver.user_id == current_user.id)
+    ).scalar_one_or_none()
     if existing_driver:
         raise HTTPException(status_code=400, detail="Driver profile already exists")
     
@@ -174,13 +261,18 @@ async def register_driver(
 
 @app.post("/drivers/upload-documents")
 async def upload_driver_documents(
+    background_tasks: BackgroundTasks,
     license_file: UploadFile = File(...),
     id_document_file: UploadFile = File(...),
     current_user: UserModel = Depends(get_current_driver_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    file_service: FileService = Depends(get_file_service),
+    external_api_service: ExternalAPIService = Depends(get_external_api_service)
 ):
     """Upload driver license and ID documents"""
-    driver = db.query(Driver).filter(Driver.user_id == current_user.id).first()
+    driver = db.execute(
+        select(Driver).where(Driver.user_id == current_user.id)
+    ).scalar_one_or_none()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver profile not found. Please register first.")
     
@@ -193,21 +285,19 @@ async def upload_driver_documents(
     driver.id_document = id_filename
     driver.documents_submitted_at = datetime.utcnow()
     
-    # Send to external API for approval
-    response = await external_api_service.send_documents_for_approval_async(
-        driver, license_filename, id_filename
-    )
-    
-    # Record the approval attempt
-    external_api_service.record_approval_attempt(db, driver.id, response)
-    
     db.commit()
-    
+
+    # Send to the external API off the request path; the upload response
+    # returns as soon as the files hit disk
+    background_tasks.add_task(
+        external_api_service.send_and_record, driver.id, license_filename, id_filename
+    )
+
     return {
-        "message": "Documents uploaded successfully and sent for approval",
+        "message": "Documents uploaded successfully and queued for approval",
         "license_document": license_filename,
         "id_document": id_filename,
-        "external_api_status": response.get("message", "Unknown")
+        "external_api_status": "queued"
     }
 
 @app.put("/drivers/location")
@@ -250,7 +340,9 @@ async def get_my_driver_profile(current_driver: DriverModel = Depends(get_curren
 async def create_order(
     order: schemas.OrderCreate,
     current_store: UserModel = Depends(get_current_store),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    osrm_client: OSRMClient = Depends(get_osrm_client),
+    assignment_service: DriverAssignmentService = Depends(get_assignment_service)
 ):
     """Create a new delivery order
     
@@ -300,7 +392,7 @@ async def create_order(
     pickup_location = (order.pickup_latitude, order.pickup_longitude)
     delivery_location = (order.delivery_latitude, order.delivery_longitude)
     
-    route_info = OSRMClient.get_distance_and_duration(None, pickup_location, delivery_location)
+    route_info = await osrm_client.get_distance_and_duration_async(pickup_location, delivery_location)
     
     # Generate order data
     order_data = order.dict()
@@ -315,15 +407,21 @@ async def create_order(
         # order_number=order_number,  # Usar el número generado automáticamente
         store_id=current_store.id,
         estimated_distance_km=route_info["distance_km"] if route_info else None,
-        estimated_duration_minutes=route_info["duration_minutes"] if route_info else None
+        # OSRM durations are fractional minutes; the column and the WS
+        # schema both want whole minutes
+        estimated_duration_minutes=round(route_info["duration_minutes"]) if route_info else None
     )
     
     db.add(db_order)
     db.commit()
     db.refresh(db_order)
     
-    # Find and notify suitable drivers
-    suitable_drivers = assignment_service.get_drivers_for_notification(db, db_order)
+    # Find and notify suitable drivers. The candidate query and the OSRM
+    # Table request are blocking, so run the fan-out in the threadpool
+    # instead of stalling the event loop
+    suitable_drivers = await run_in_threadpool(
+        assignment_service.get_drivers_for_notification, db, db_order
+    )
     
     if suitable_drivers:
         # Create WebSocket notification
@@ -332,14 +430,15 @@ async def create_order(
             pickup_address=db_order.pickup_address,
             delivery_address=db_order.delivery_address,
             distance_km=route_info["distance_km"] if route_info else 0,
-            estimated_duration_minutes=route_info["duration_minutes"] if route_info else None,
+            estimated_duration_minutes=round(route_info["duration_minutes"]) if route_info else None,
             customer_name=db_order.customer_name,
             items_description=db_order.items_description
         )
         
-        # Notify drivers via WebSocket
+        # Notify drivers via WebSocket off the critical path: the order
+        # response returns right after the commit while fanout races on
         driver_ids = [d["driver_id"] for d in suitable_drivers]
-        await manager.notify_drivers_about_order(driver_ids, order_notification)
+        _spawn_background_task(manager.notify_drivers_about_order(driver_ids, order_notification))
     
     return db_order
 
@@ -353,22 +452,48 @@ async def get_orders(
 ):
     """Get orders (filtered by current user type)"""
     query = db.query(OrderModel)
-    
+
     if current_user.user_type == UserType.STORE:
         query = query.filter(OrderModel.store_id == current_user.id)
     elif current_user.user_type == UserType.DRIVER:
-        driver = db.query(DriverModel).filter(DriverModel.user_id == current_user.id).first()
-        if driver:
-            query = query.filter(OrderModel.driver_id == driver.id)
-        else:
-            return schemas.OrderListResponse(orders=[], total=0)
-    
+        # Resolve user -> driver inside the orders query instead of a
+        # separate SELECT on drivers first
+        query = query.join(DriverModel, DriverModel.id == OrderModel.driver_id).filter(
+            DriverModel.user_id == current_user.id
+        )
+
     if status:
         query = query.filter(OrderModel.status == status)
-    
-    total = query.count()
-    orders = query.offset(offset).limit(limit).all()
-    
+
+    # Fetch only the columns OrderSummary serializes (skips the wide Text
+    # instruction/description fields), with the total via a window
+    # function in the same roundtrip
+    rows = (
+        query.options(
+            load_only(
+                OrderModel.id,
+                OrderModel.order_number,
+                OrderModel.store_id,
+                OrderModel.store_name,
+                OrderModel.driver_id,
+                OrderModel.customer_name,
+                OrderModel.pickup_address,
+                OrderModel.delivery_address,
+                OrderModel.status,
+                OrderModel.created_at,
+                OrderModel.estimated_distance_km,
+                OrderModel.estimated_duration_minutes,
+            )
+        )
+        .add_columns(func.count().over())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+
+    orders = [row[0] for row in rows]
+    total = rows[0][1] if rows else query.count()
+
     return schemas.OrderListResponse(orders=orders, total=total)
 
 @app.get("/orders/{order_id}", response_model=schemas.Order)
@@ -378,25 +503,28 @@ async def get_order(
     db: Session = Depends(get_db)
 ):
     """Get specific order details"""
-    
+    # PK lookup via Session.get hits the identity map
+    order = db.get(OrderModel, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
     if current_user.user_type == UserType.STORE and order.store_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     elif current_user.user_type == UserType.DRIVER:
-        driver = db.query(DriverModel).filter(DriverModel.user_id == current_user.id).first()
+        driver = db.execute(
+            select(DriverModel).where(DriverModel.user_id == current_user.id)
+        ).scalar_one_or_none()
         if not driver or order.driver_id != driver.id:
             raise HTTPException(status_code=403, detail="Access denied")
 
-    order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
     return order
 
 @app.post("/orders/{order_id}/accept")
 async def accept_order(
     order_id: int,
     current_driver: DriverModel = Depends(get_current_driver),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    assignment_service: DriverAssignmentService = Depends(get_assignment_service)
 ):
     """Accept a delivery order (first-come-first-served)"""
     if current_driver.approval_status != ApprovalStatus.APPROVED:
@@ -425,7 +553,8 @@ async def accept_order(
 async def reject_order(
     order_id: int,
     current_driver: DriverModel = Depends(get_current_driver),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    assignment_service: DriverAssignmentService = Depends(get_assignment_service)
 ):
     """Reject a delivery order"""
     assignment_service.reject_order(db, order_id, current_driver.id)
@@ -439,10 +568,12 @@ async def update_order_status(
     db: Session = Depends(get_db)
 ):
     """Update order status (pickup, delivered, etc.)"""
-    order = db.query(OrderModel).filter(
-        OrderModel.id == order_id,
-        OrderModel.driver_id == current_driver.id
-    ).first()
+    order = db.execute(
+        select(OrderModel).where(
+            OrderModel.id == order_id,
+            OrderModel.driver_id == current_driver.id
+        )
+    ).scalar_one_or_none()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found or not assigned to you")
@@ -554,7 +685,11 @@ async def websocket_endpoint(websocket: WebSocket, token: str = Query(..., descr
 
 # External webhook endpoint for document approval
 @app.post("/webhooks/approval")
-async def approval_webhook(approval_data: dict, db: Session = Depends(get_db)):
+async def approval_webhook(
+    approval_data: dict,
+    db: Session = Depends(get_db),
+    external_api_service: ExternalAPIService = Depends(get_external_api_service)
+):
     """Webhook to receive approval status from external service"""
     success = external_api_service.process_approval_webhook(db, approval_data)
     
@@ -570,19 +705,17 @@ async def get_driver_stats(
     db: Session = Depends(get_db)
 ):
     """Get driver statistics"""
-    total_deliveries = db.query(OrderModel).filter(
-        OrderModel.driver_id == current_driver.id,
-        OrderModel.status == OrderStatus.DELIVERED
-    ).count()
-    
-    pending_deliveries = db.query(OrderModel).filter(
-        OrderModel.driver_id == current_driver.id,
-        OrderModel.status.in_([OrderStatus.ASSIGNED.value, OrderStatus.IN_PROGRESS.value])
-    ).count()
-    
+    # Conditional aggregation: both counts in one roundtrip
+    row = db.query(
+        func.count().filter(OrderModel.status == OrderStatus.DELIVERED).label("total"),
+        func.count().filter(
+            OrderModel.status.in_([OrderStatus.ASSIGNED, OrderStatus.IN_PROGRESS])
+        ).label("pending")
+    ).filter(OrderModel.driver_id == current_driver.id).one()
+
     return {
-        "total_deliveries": total_deliveries,
-        "pending_deliveries": pending_deliveries,
+        "total_deliveries": row.total,
+        "pending_deliveries": row.pending,
         "approval_status": current_driver.approval_status,
         "current_status": current_driver.status
     }
@@ -593,16 +726,20 @@ async def get_order_stats(
     db: Session = Depends(get_db)
 ):
     """Get order statistics for stores"""
-    base_query = db.query(OrderModel).filter(OrderModel.store_id == current_store.id)
-    
-    stats = {
-        "pending_orders": base_query.filter(OrderModel.status == OrderStatus.PENDING).count(),
-        "assigned_orders": base_query.filter(OrderModel.status == OrderStatus.ASSIGNED).count(),
-        "in_progress_orders": base_query.filter(OrderModel.status == OrderStatus.IN_PROGRESS).count(),
-        "completed_orders": base_query.filter(OrderModel.status == OrderStatus.DELIVERED).count()
+    # Conditional aggregation: all four counts in one roundtrip
+    row = db.query(
+        func.count().filter(OrderModel.status == OrderStatus.PENDING).label("pending"),
+        func.count().filter(OrderModel.status == OrderStatus.ASSIGNED).label("assigned"),
+        func.count().filter(OrderModel.status == OrderStatus.IN_PROGRESS).label("in_progress"),
+        func.count().filter(OrderModel.status == OrderStatus.DELIVERED).label("completed")
+    ).filter(OrderModel.store_id == current_store.id).one()
+
+    return {
+        "pending_orders": row.pending,
+        "assigned_orders": row.assigned,
+        "in_progress_orders": row.in_progress,
+        "completed_orders": row.completed
     }
-    
-    return stats
 
 # Health check endpoint
 @app.get("/health")
@@ -615,9 +752,26 @@ async def root():
     return {"Hello": "World"}
 
 if __name__ == "__main__":
+    # uvloop + httptools are drop-in faster loop/parser implementations;
+    # uvicorn picks them up automatically when installed, the explicit
+    # flags just document the intent
     uvicorn.run(
-        "main:app", 
+        "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        loop="uvloop",
+        http="httptools",
+        # Must stay single-process: the WebSocket ConnectionManager and
+        # the token/auth caches are in-memory per worker, so with N
+        # workers an order created on one worker could never notify
+        # drivers connected to another. Scale out only after connection
+        # state moves to an external broker
+        workers=1,
+        # Broadcast payloads are pre-compressed once in the connection
+        # manager; per-connection deflate would just redo that work
+        ws_per_message_deflate=False,
+        # Protocol-level pings surface dead clients that never sent a
+        # close frame, so their receive loops unwind promptly
+        ws_ping_interval=20,
+        ws_ping_timeout=20
     )
\ No newline at end of file
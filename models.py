@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -32,13 +33,21 @@ class VehicleType(str, Enum):
     VAN = "van"
     TRUCK = "truck"
 
+def _sql_enum(enum_cls):
+    """Native database enum storing the members' .value strings"""
+    return SQLEnum(
+        enum_cls,
+        native_enum=True,
+        values_callable=lambda e: [member.value for member in e]
+    )
+
 class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
-    user_type = Column(SQLEnum(UserType), nullable=False)
+    user_type = Column(_sql_enum(UserType), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -48,7 +57,12 @@ class User(Base):
 
 class Driver(Base):
     __tablename__ = "drivers"
-    
+    __table_args__ = (
+        # Assignment scans drivers by availability + approval, then by location
+        Index("ix_drivers_status_approval", "status", "approval_status"),
+        Index("ix_drivers_location", "current_latitude", "current_longitude"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
     
@@ -58,7 +72,7 @@ class Driver(Base):
     phone_number = Column(String, nullable=False)
     
     # Vehicle information
-    vehicle_type = Column(SQLEnum(VehicleType), nullable=False)
+    vehicle_type = Column(_sql_enum(VehicleType), nullable=False)
     vehicle_plate = Column(String, nullable=False)
     vehicle_model = Column(String, nullable=False)
     vehicle_year = Column(Integer, nullable=False)
@@ -69,8 +83,8 @@ class Driver(Base):
     last_location_update = Column(DateTime(timezone=True))
     
     # Status
-    status = Column(SQLEnum(DriverStatus), default=DriverStatus.OFFLINE)
-    approval_status = Column(SQLEnum(ApprovalStatus), default=ApprovalStatus.PENDING)
+    status = Column(_sql_enum(DriverStatus), default=DriverStatus.OFFLINE)
+    approval_status = Column(_sql_enum(ApprovalStatus), default=ApprovalStatus.PENDING)
     
     # Documentation
     license_document = Column(String)  # File path
@@ -87,7 +101,13 @@ class Driver(Base):
 
 class Order(Base):
     __tablename__ = "orders"
-    
+    __table_args__ = (
+        # Order listings and stats always filter by owner + status
+        Index("ix_orders_store_status", "store_id", "status"),
+        Index("ix_orders_driver_status", "driver_id", "status"),
+        Index("ix_orders_status_created", "status", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     
     # Store information
@@ -120,7 +140,7 @@ class Order(Base):
     value = Column(Float)
     
     # Status and timing
-    status = Column(SQLEnum(OrderStatus), default=OrderStatus.PENDING)
+    status = Column(_sql_enum(OrderStatus), default=OrderStatus.PENDING)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     assigned_at = Column(DateTime(timezone=True))
     picked_up_at = Column(DateTime(timezone=True))
@@ -157,7 +177,7 @@ class DocumentApproval(Base):
     
     # Approval details
     sent_to_external_api = Column(Boolean, default=False)
-    external_api_response = Column(Text)
+    external_api_response = Column(JSONB)
     sent_at = Column(DateTime(timezone=True))
     processed_at = Column(DateTime(timezone=True))
     
@@ -1,71 +1,219 @@
 import requests
-import asyncio
+import orjson
+import numpy as np
+from math import asin, cos, radians, sin, sqrt
+from requests.adapters import HTTPAdapter
+from cachetools import TTLCache
 from typing import List, Tuple, Optional
 from config import OSRM_BASE_URL
+from http_client import get_async_client
+
+# Numba is optional: the NumPy sweep is plenty below this batch size,
+# and small deployments shouldn't need the extra dependency
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Hot pickup/driver pairs repeat within seconds; cache entries expire
+# after a minute so stale routes can't linger. 5 decimals ≈ 1m.
+ROUTE_CACHE_SIZE = 10000
+ROUTE_CACHE_TTL_SECONDS = 60
+COORDINATE_PRECISION = 5
+
+# Fleet size above which the fused Numba kernel beats NumPy (which
+# allocates several intermediate arrays per call)
+NUMBA_MIN_BATCH = 1000
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _haversine_kernel(origin_lat_r, origin_lon_r, lats, lons, out):  # pragma: no cover - compiled
+        deg2rad = 0.017453292519943295
+        for i in prange(lats.shape[0]):
+            lat_r = lats[i] * deg2rad
+            dlat = lat_r - origin_lat_r
+            dlon = lons[i] * deg2rad - origin_lon_r
+            a = np.sin(dlat / 2) ** 2 + np.cos(origin_lat_r) * np.cos(lat_r) * np.sin(dlon / 2) ** 2
+            out[i] = 12742.0 * np.arcsin(np.sqrt(a))
+else:
+    _haversine_kernel = None
 
 class OSRMClient:
     def __init__(self, base_url: str = OSRM_BASE_URL):
         self.base_url = base_url.rstrip('/')
-        
+        self._route_cache: TTLCache = TTLCache(maxsize=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL_SECONDS)
+
+        # Persistent session: keep-alive sockets instead of a fresh
+        # TCP+TLS handshake per sync OSRM call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
     def _build_coordinates_string(self, coordinates: List[Tuple[float, float]]) -> str:
         """Build coordinate string for OSRM API"""
         return ";".join([f"{lon},{lat}" for lat, lon in coordinates])
-    
+
+    @staticmethod
+    def _cache_key(start: Tuple[float, float], end: Tuple[float, float]) -> tuple:
+        """Cache key from coordinates rounded to COORDINATE_PRECISION decimals"""
+        p = COORDINATE_PRECISION
+        return (round(start[0], p), round(start[1], p), round(end[0], p), round(end[1], p))
+
+    @staticmethod
+    def _parse_route_response(data: dict) -> Optional[dict]:
+        """Extract distance/duration from an OSRM route response"""
+        if data["code"] != "Ok" or not data["routes"]:
+            return None
+
+        route = data["routes"][0]
+        distance_m = route["distance"]
+        duration_s = route["duration"]
+
+        return {
+            "distance_km": distance_m / 1000,
+            "duration_minutes": duration_s / 60,
+            "distance_m": distance_m,
+            "duration_s": duration_s
+        }
+
     def get_distance_and_duration(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[dict]:
         """
         Get distance and duration between two points using OSRM
         Returns dict with distance_km and duration_minutes
         """
+        cache_key = self._cache_key(start, end)
+        cached = self._route_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             coordinates = self._build_coordinates_string([start, end])
             url = f"{self.base_url}/route/v1/driving/{coordinates}"
-            
+
             params = {
                 "overview": "false",
                 "steps": "false",
                 "geometries": "geojson"
             }
-            
-            response = requests.get(url, params=params, timeout=10)
+
+            response = self.session.get(url, params=params, timeout=10)
             response.raise_for_status()
-            
-            data = response.json()
-            
-            if data["code"] != "Ok" or not data["routes"]:
-                return None
-            
-            route = data["routes"][0]
-            distance_m = route["distance"]
-            duration_s = route["duration"]
-            
-            return {
-                "distance_km": distance_m / 1000,
-                "duration_minutes": duration_s / 60,
-                "distance_m": distance_m,
-                "duration_s": duration_s
-            }
-            
+
+            result = self._parse_route_response(orjson.loads(response.content))
+            if result is not None:
+                self._route_cache[cache_key] = result
+            return result
+
         except Exception as e:
             print(f"OSRM API error: {e}")
             return None
     
+    def _table_request(self, start: Tuple[float, float], destinations: List[Tuple[float, float]]) -> Optional[Tuple[list, list]]:
+        """
+        Call the OSRM Table service: one request for start -> N destinations
+        Returns (durations_row, distances_row) with per-cell None for
+        unroutable pairs, or None if the whole request failed
+        """
+        try:
+            coordinates = self._build_coordinates_string([start] + list(destinations))
+            url = f"{self.base_url}/table/v1/driving/{coordinates}"
+
+            params = {
+                "sources": "0",
+                "annotations": "duration,distance"
+            }
+
+            response = self.session.get(url, params=params, timeout=10)
+            response.raise_for_status()
+
+            data = orjson.loads(response.content)
+
+            if data["code"] != "Ok":
+                return None
+
+            # Row 0 is the source; drop the start->start cell
+            return data["durations"][0][1:], data["distances"][0][1:]
+
+        except Exception as e:
+            print(f"OSRM Table API error: {e}")
+            return None
+
     def get_distances_from_point(self, start: Tuple[float, float], destinations: List[Tuple[float, float]]) -> List[Optional[dict]]:
         """
-        Get distances from one point to multiple destinations
+        Get distances from one point to multiple destinations in a single
+        Table request instead of one route call per destination
         Returns list of distance/duration dicts in same order as destinations
         """
-        results = []
-        
-        for destination in destinations:
-            result = self.get_distance_and_duration(start, destination)
-            results.append(result)
-        
+        if not destinations:
+            return []
+
+        # Partial cache hits: only the missing destinations go to OSRM
+        results: List[Optional[dict]] = [None] * len(destinations)
+        miss_indexes = []
+
+        for i, destination in enumerate(destinations):
+            cached = self._route_cache.get(self._cache_key(start, destination))
+            if cached is not None:
+                results[i] = cached
+            else:
+                miss_indexes.append(i)
+
+        if not miss_indexes:
+            return results
+
+        table = self._table_request(start, [destinations[i] for i in miss_indexes])
+        if table is None:
+            return results
+
+        durations, distances = table
+
+        for j, i in enumerate(miss_indexes):
+            duration_s = durations[j]
+            distance_m = distances[j]
+            if duration_s is None or distance_m is None:
+                continue
+            result = {
+                "distance_km": distance_m / 1000,
+                "duration_minutes": duration_s / 60,
+                "distance_m": distance_m,
+                "duration_s": duration_s
+            }
+            self._route_cache[self._cache_key(start, destinations[i])] = result
+            results[i] = result
+
         return results
     
     async def get_distance_and_duration_async(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[dict]:
-        """Async version of get_distance_and_duration"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.get_distance_and_duration, start, end)
+        """Async version of get_distance_and_duration using the shared httpx client"""
+        cache_key = self._cache_key(start, end)
+        cached = self._route_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            coordinates = self._build_coordinates_string([start, end])
+
+            params = {
+                "overview": "false",
+                "steps": "false",
+                "geometries": "geojson"
+            }
+
+            response = await get_async_client().get(
+                f"{self.base_url}/route/v1/driving/{coordinates}", params=params
+            )
+            response.raise_for_status()
+
+            result = self._parse_route_response(orjson.loads(response.content))
+            if result is not None:
+                self._route_cache[cache_key] = result
+            return result
+
+        except Exception as e:
+            print(f"OSRM API error: {e}")
+            return None
     
     def calculate_drivers_distances(self, pickup_location: Tuple[float, float], driver_locations: List[Tuple[float, float, int]]) -> List[dict]:
         """
@@ -73,12 +221,30 @@ class OSRMClient:
         driver_locations: List of (lat, lon, driver_id) tuples
         Returns: List of dicts with driver_id, distance_km, duration_minutes
         """
+        if not driver_locations:
+            return []
+
+        # One vectorized sweep over all drivers for the straight-line
+        # distances, used as fallback wherever OSRM can't route the pair
+        lats = np.fromiter((lat for lat, _, _ in driver_locations), dtype=np.float64)
+        lons = np.fromiter((lon for _, lon, _ in driver_locations), dtype=np.float64)
+        fallback_km = self.calculate_haversine_distances_bulk(pickup_location, lats, lons)
+
+        # One Table request for the whole fleet instead of N route calls
+        route_infos = self.get_distances_from_point(
+            pickup_location, [(lat, lon) for lat, lon, _ in driver_locations]
+        )
+
+        return self._assemble_driver_distances(driver_locations, route_infos, fallback_km)
+
+    @staticmethod
+    def _assemble_driver_distances(driver_locations: List[Tuple[float, float, int]], route_infos: List[Optional[dict]], fallback_km: "np.ndarray") -> List[dict]:
+        """Zip route results with driver ids, falling back to haversine estimates"""
         results = []
-        
-        for lat, lon, driver_id in driver_locations:
-            driver_location = (lat, lon)
-            route_info = self.get_distance_and_duration(pickup_location, driver_location)
-            
+
+        for i, (lat, lon, driver_id) in enumerate(driver_locations):
+            route_info = route_infos[i]
+
             if route_info:
                 results.append({
                     "driver_id": driver_id,
@@ -86,15 +252,38 @@ class OSRMClient:
                     "duration_minutes": route_info["duration_minutes"]
                 })
             else:
-                # If OSRM fails, calculate straight-line distance as fallback
-                distance_km = self.calculate_haversine_distance(pickup_location, driver_location)
+                distance_km = float(fallback_km[i])
                 results.append({
                     "driver_id": driver_id,
                     "distance_km": distance_km,
                     "duration_minutes": distance_km * 2  # Rough estimate: 2 minutes per km in city
                 })
-        
+
         return results
+
+    @staticmethod
+    def calculate_haversine_distances_bulk(origin: Tuple[float, float], lats: "np.ndarray", lons: "np.ndarray") -> "np.ndarray":
+        """
+        Vectorized great circle distance from one origin to many points
+        Returns a NumPy array of distances in kilometers
+        """
+        # Large fleets: single fused pass, no temporaries, threaded
+        if _haversine_kernel is not None and lats.shape[0] > NUMBA_MIN_BATCH:
+            out = np.empty_like(lats)
+            _haversine_kernel(radians(origin[0]), radians(origin[1]), lats, lons, out)
+            return out
+
+        origin_lat = np.radians(origin[0])
+        origin_lon = np.radians(origin[1])
+        lats_r = np.radians(lats)
+        lons_r = np.radians(lons)
+
+        dlat = lats_r - origin_lat
+        dlon = lons_r - origin_lon
+        a = np.sin(dlat / 2) ** 2 + np.cos(origin_lat) * np.cos(lats_r) * np.sin(dlon / 2) ** 2
+
+        # 12742 km = Earth diameter
+        return 12742.0 * np.arcsin(np.sqrt(a))
     
     @staticmethod
     def calculate_haversine_distance(point1: Tuple[float, float], point2: Tuple[float, float]) -> float:
@@ -102,24 +291,11 @@ class OSRMClient:
         Calculate the great circle distance between two points on earth
         Returns distance in kilometers
         """
-        import math
-        
-        lat1, lon1 = point1
-        lat2, lon2 = point2
-        
-        # Convert latitude and longitude from degrees to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Radius of earth in kilometers
-        r = 6371
-        
-        return c * r
-
-# Global OSRM client instance
-osrm_client = OSRMClient()
\ No newline at end of file
+        lat1r = radians(point1[0])
+        lon1r = radians(point1[1])
+        lat2r = radians(point2[0])
+        lon2r = radians(point2[1])
+
+        # Haversine formula; 6371 km = Earth radius
+        a = sin((lat2r - lat1r) / 2) ** 2 + cos(lat1r) * cos(lat2r) * sin((lon2r - lon1r) / 2) ** 2
+        return 2 * 6371 * asin(sqrt(a))
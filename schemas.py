@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from models import UserType, ApprovalStatus, DriverStatus, OrderStatus, VehicleType
@@ -16,8 +16,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Driver schemas
 class DriverBase(BaseModel):
@@ -52,8 +51,7 @@ class Driver(DriverBase):
     documents_submitted_at: Optional[datetime]
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Order schemas
 class OrderBase(BaseModel):
@@ -78,6 +76,23 @@ class OrderCreate(OrderBase):
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
 
+class OrderSummary(BaseModel):
+    """Slim projection of Order for list endpoints"""
+    id: int
+    order_number: Optional[str]
+    store_id: int
+    store_name: str
+    driver_id: Optional[int]
+    customer_name: str
+    pickup_address: str
+    delivery_address: str
+    status: OrderStatus
+    created_at: datetime
+    estimated_distance_km: Optional[float]
+    estimated_duration_minutes: Optional[int]
+
+    model_config = ConfigDict(from_attributes=True)
+
 class Order(OrderBase):
     id: int
     store_id: int
@@ -91,8 +106,7 @@ class Order(OrderBase):
     estimated_distance_km: Optional[float]
     estimated_duration_minutes: Optional[int]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Authentication schemas
 class Token(BaseModel):
@@ -121,6 +135,11 @@ class OrderNotificationWS(BaseModel):
     customer_name: str
     items_description: Optional[str]
 
+class DriverMessageWS(BaseModel):
+    """Envelope for messages drivers send over the WebSocket"""
+    type: str
+    data: dict = {}
+
 class OrderAcceptance(BaseModel):
     order_id: int
     action: str = Field(..., pattern="^(accept|reject)$")
@@ -151,7 +170,7 @@ class DriverListResponse(BaseModel):
     total: int
 
 class OrderListResponse(BaseModel):
-    orders: List[Order]
+    orders: List[OrderSummary]
     total: int
 
 # Statistics schemas
@@ -1,51 +1,104 @@
+import heapq
+import math
+from datetime import datetime
+from bisect import bisect_left
 from typing import List, Optional, Tuple
+from sqlalchemy import func, insert, update
 from sqlalchemy.orm import Session
-from models import Driver, Order, OrderNotification
-from osrm_client import osrm_client
+from models import (
+    ApprovalStatus,
+    Driver,
+    DriverStatus,
+    Order,
+    OrderNotification,
+    OrderStatus,
+    VehicleType,
+)
+from osrm_client import OSRMClient
 from config import MAX_DISTANCE_KM, MAX_DRIVERS_TO_NOTIFY
 import config
 
+# How many nearest candidates (by straight-line distance) to pass to OSRM
+# for precise road distances
+CANDIDATE_POOL_MULTIPLIER = 3
+
+# Weight (kg) thresholds mapping an order to the smallest vehicle that fits
+_VEHICLE_WEIGHT_THRESHOLDS = (5, 50, 200)
+_VEHICLE_TYPES_BY_WEIGHT = ("motorcycle", "car", "van", "truck")
+
+# Lowercase name -> enum member, so the hot filter path doesn't do
+# .upper() + getattr per call (and unknown types fail as KeyError here
+# rather than an AttributeError inside the query build)
+_VEHICLE_TYPE_BY_NAME = {vt.value: vt for vt in VehicleType}
+
 class DriverAssignmentService:
-    def __init__(self):
+    def __init__(self, osrm_client: OSRMClient):
         self.osrm_client = osrm_client
-    
+
+    @staticmethod
+    def _sql_haversine_km(pickup_location: Tuple[float, float]):
+        """
+        Great-circle distance (km) from pickup to the driver's last known
+        location, computed in SQL so filtering/sorting happens in the database
+        """
+        lat, lon = pickup_location
+        return 2.0 * 6371.0 * func.asin(func.sqrt(
+            func.pow(func.sin(func.radians(Driver.current_latitude - lat) / 2.0), 2)
+            + math.cos(math.radians(lat))
+            * func.cos(func.radians(Driver.current_latitude))
+            * func.pow(func.sin(func.radians(Driver.current_longitude - lon) / 2.0), 2)
+        ))
+
     def find_available_drivers(self, db: Session, vehicle_type: str, pickup_location: Tuple[float, float]) -> List[dict]:
         """
         Find available drivers for an order based on vehicle type and location
         Returns list of driver info with distances
         """
-        # Get available approved drivers with the required vehicle type
-        from models import DriverStatus, ApprovalStatus, VehicleType
+        # Get available approved drivers with the required vehicle type,
+        # pre-filtered and sorted by distance in SQL. Straight-line distance
+        # never exceeds road distance, so this drops no valid candidate.
+        pickup_lat, pickup_lon = pickup_location
+
+        # Cheap bounding box of radius MAX_DISTANCE_KM so the (lat, lon)
+        # index prunes most of the table before the haversine expression
+        # runs; 1 degree of latitude ≈ 111 km
+        lat_delta = MAX_DISTANCE_KM / 111.0
+        lon_delta = MAX_DISTANCE_KM / (111.0 * max(math.cos(math.radians(pickup_lat)), 0.01))
+
+        distance_expr = self._sql_haversine_km(pickup_location)
         drivers = db.query(Driver).filter(
             Driver.status == DriverStatus.AVAILABLE,
             Driver.approval_status == ApprovalStatus.APPROVED,
-            Driver.vehicle_type == getattr(VehicleType, vehicle_type.upper()),
+            Driver.vehicle_type == _VEHICLE_TYPE_BY_NAME[vehicle_type],
             Driver.current_latitude.is_not(None),
-            Driver.current_longitude.is_not(None)
+            Driver.current_longitude.is_not(None),
+            Driver.current_latitude.between(pickup_lat - lat_delta, pickup_lat + lat_delta),
+            Driver.current_longitude.between(pickup_lon - lon_delta, pickup_lon + lon_delta),
+            distance_expr <= MAX_DISTANCE_KM
+        ).order_by(distance_expr).limit(
+            MAX_DRIVERS_TO_NOTIFY * CANDIDATE_POOL_MULTIPLIER
         ).all()
         
         if not drivers:
             return []
         
-        # Prepare driver locations for distance calculation
-        driver_locations = []
-        for driver in drivers:
-            if driver.current_latitude is not None and driver.current_longitude is not None:
-                driver_locations.append((
-                    float(driver.current_latitude),
-                    float(driver.current_longitude), 
-                    int(driver.id)
-                ))
-        
+        # Prepare driver locations for distance calculation; the query
+        # already excludes NULL coordinates
+        driver_locations = [
+            (float(driver.current_latitude), float(driver.current_longitude), int(driver.id))
+            for driver in drivers
+        ]
+
         # Calculate distances using OSRM
         distances = self.osrm_client.calculate_drivers_distances(pickup_location, driver_locations)
         
-        # Filter by maximum distance and sort by distance
+        # Filter by maximum distance; O(1) id lookup instead of scanning
+        # the driver list per distance entry
+        drivers_by_id = {int(d.id): d for d in drivers}
         suitable_drivers = []
         for distance_info in distances:
             if distance_info["distance_km"] <= MAX_DISTANCE_KM:
-                # Get full driver info
-                driver = next((d for d in drivers if d.id == distance_info["driver_id"]), None)
+                driver = drivers_by_id.get(distance_info["driver_id"])
                 if driver:
                     suitable_drivers.append({
                         "driver_id": driver.id,
@@ -53,36 +106,36 @@ class DriverAssignmentService:
                         "distance_km": distance_info["distance_km"],
                         "duration_minutes": distance_info["duration_minutes"]
                     })
-        
-        # Sort by distance (closest first) and limit to MAX_DRIVERS_TO_NOTIFY
-        suitable_drivers.sort(key=lambda x: x["distance_km"])
-        return suitable_drivers[:MAX_DRIVERS_TO_NOTIFY]
+
+        # Closest MAX_DRIVERS_TO_NOTIFY without sorting the whole list
+        return heapq.nsmallest(
+            MAX_DRIVERS_TO_NOTIFY, suitable_drivers, key=lambda x: x["distance_km"]
+        )
     
     def get_best_vehicle_type_for_order(self, weight_kg: Optional[float], value: Optional[float]) -> str:
         """
         Determine the best vehicle type based on order characteristics
         """
-        if weight_kg is None:
-            weight_kg = 1.0  # Default light weight
-        
-        if weight_kg <= 5:
-            return "motorcycle"
-        elif weight_kg <= 50:
-            return "car"
-        elif weight_kg <= 200:
-            return "van"
-        else:
-            return "truck"
+        # Default light weight when unspecified; bisect into the threshold
+        # tuple instead of a cascading if/elif
+        return _VEHICLE_TYPES_BY_WEIGHT[bisect_left(_VEHICLE_WEIGHT_THRESHOLDS, weight_kg or 1.0)]
     
     def create_order_notifications(self, db: Session, order_id: int, driver_distances: List[dict]):
-        """Create notification records for drivers"""
-        for driver_info in driver_distances:
-            notification = OrderNotification(
-                order_id=order_id,
-                driver_id=driver_info["driver_id"],
-                distance_km=driver_info["distance_km"]
-            )
-            db.add(notification)
+        """Create notification records for drivers in a single multi-row INSERT"""
+        if not driver_distances:
+            return
+
+        db.execute(
+            insert(OrderNotification),
+            [
+                {
+                    "order_id": order_id,
+                    "driver_id": driver_info["driver_id"],
+                    "distance_km": driver_info["distance_km"]
+                }
+                for driver_info in driver_distances
+            ]
+        )
         db.commit()
     
     def assign_order_to_first_accepter(self, db: Session, order_id: int, driver_id: int) -> bool:
@@ -90,16 +143,14 @@ class DriverAssignmentService:
         Assign order to the first driver who accepts with proper concurrency control
         Returns True if assignment successful, False if order already assigned
         """
-        from models import OrderStatus, DriverStatus, ApprovalStatus
-        from sqlalchemy import func
-        from datetime import datetime
-        
         try:
-            # Use SELECT FOR UPDATE to prevent race conditions
+            # SELECT FOR UPDATE SKIP LOCKED: the first accepter takes the
+            # row lock, concurrent losers see no row and return immediately
+            # instead of queueing on the lock
             order = db.query(Order).filter(
                 Order.id == order_id,
                 Order.status == OrderStatus.PENDING
-            ).with_for_update().first()
+            ).with_for_update(skip_locked=True).first()
             
             if not order:
                 return False
@@ -132,17 +183,18 @@ class DriverAssignmentService:
                 notification.response = "accepted"
                 notification.response_at = datetime.utcnow()
             
-            # Mark other notifications as expired/rejected
-            other_notifications = db.query(OrderNotification).filter(
-                OrderNotification.order_id == order_id,
-                OrderNotification.driver_id != driver_id,
-                OrderNotification.response.is_(None)
-            ).all()
-            
-            for notif in other_notifications:
-                notif.response = "expired"
-                notif.response_at = datetime.utcnow()
-            
+            # Mark other notifications as expired in one UPDATE instead of
+            # loading and mutating each row
+            db.execute(
+                update(OrderNotification)
+                .where(
+                    OrderNotification.order_id == order_id,
+                    OrderNotification.driver_id != driver_id,
+                    OrderNotification.response.is_(None)
+                )
+                .values(response="expired", response_at=datetime.utcnow())
+            )
+
             db.commit()
             return True
             
@@ -153,8 +205,6 @@ class DriverAssignmentService:
     
     def reject_order(self, db: Session, order_id: int, driver_id: int):
         """Mark that a driver rejected an order"""
-        from datetime import datetime
-        
         notification = db.query(OrderNotification).filter(
             OrderNotification.order_id == order_id,
             OrderNotification.driver_id == driver_id
@@ -184,6 +234,3 @@ class DriverAssignmentService:
             self.create_order_notifications(db, int(order.id), suitable_drivers)
         
         return suitable_drivers
-
-# Global assignment service instance
-assignment_service = DriverAssignmentService()
\ No newline at end of file
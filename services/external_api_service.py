@@ -1,20 +1,30 @@
 import requests
-import asyncio
+import orjson
+from requests.adapters import HTTPAdapter
 from typing import Dict, Optional
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
-from models import Driver, DocumentApproval
+from database import SessionLocal
+from models import ApprovalStatus, Driver, DocumentApproval
 from config import APPROVAL_API_URL, APPROVAL_API_KEY
 
 class ExternalAPIService:
     def __init__(self):
         self.approval_api_url = APPROVAL_API_URL
         self.approval_api_key = APPROVAL_API_KEY
+
+        # Persistent session so repeated approval calls reuse sockets
+        # instead of paying a TCP+TLS handshake each time
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
     
-    def send_documents_for_approval(self, driver: Driver, license_path: str, id_document_path: str) -> Dict:
-        """Send driver documents to external API for approval"""
-        
-        # Prepare data for external API
-        payload = {
+    @staticmethod
+    def _build_approval_payload(driver: Driver, license_path: str, id_document_path: str) -> Dict:
+        """Prepare the document-approval payload for the external API"""
+        return {
             "driver_id": driver.id,
             "driver_info": {
                 "first_name": driver.first_name,
@@ -30,16 +40,20 @@ class ExternalAPIService:
                 "id_document": id_document_path
             }
         }
-        
+
+    def send_documents_for_approval(self, driver: Driver, license_path: str, id_document_path: str) -> Dict:
+        """Send driver documents to external API for approval"""
+        payload = self._build_approval_payload(driver, license_path, id_document_path)
+
         headers = {
             "Authorization": f"Bearer {self.approval_api_key}",
             "Content-Type": "application/json"
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.approval_api_url}/validate-driver",
-                json=payload,
+                data=orjson.dumps(payload),
                 headers=headers,
                 timeout=30
             )
@@ -64,17 +78,29 @@ class ExternalAPIService:
                 "error": str(e)
             }
     
-    async def send_documents_for_approval_async(self, driver: Driver, license_path: str, id_document_path: str) -> Dict:
-        """Async version of send_documents_for_approval"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.send_documents_for_approval, driver, license_path, id_document_path)
+    def send_and_record(self, driver_id: int, license_path: str, id_document_path: str):
+        """
+        Send documents for approval and record the attempt.
+        Runs as a background task, so it opens its own DB session instead
+        of sharing the request's.
+        """
+        db = SessionLocal()
+        try:
+            driver = db.query(Driver).filter(Driver.id == driver_id).first()
+            if not driver:
+                return
+
+            response = self.send_documents_for_approval(driver, license_path, id_document_path)
+            self.record_approval_attempt(db, driver_id, response)
+        finally:
+            db.close()
     
     def record_approval_attempt(self, db: Session, driver_id: int, response: Dict):
         """Record the approval attempt in database"""
         approval_record = DocumentApproval(
             driver_id=driver_id,
             sent_to_external_api=True,
-            external_api_response=str(response),
+            external_api_response=response,
             sent_at=None  # Will be set by SQL
         )
         
@@ -99,39 +125,45 @@ class ExternalAPIService:
             driver_id = webhook_data.get("driver_id")
             if not driver_id:
                 return False
-            
-            # Update driver approval status
-            driver = db.query(Driver).filter(Driver.id == driver_id).first()
-            if not driver:
-                return False
-            
-            # Update approval record
-            approval_record = db.query(DocumentApproval).filter(
-                DocumentApproval.driver_id == driver_id
-            ).order_by(DocumentApproval.sent_at.desc()).first()
-            
-            if approval_record:
-                approval_record.license_approved = webhook_data.get("license_approved", False)
-                approval_record.id_document_approved = webhook_data.get("id_document_approved", False)
-                approval_record.notes = webhook_data.get("notes", "")
-                approval_record.processed_at = None  # Will be set by SQL
-            
-            # Update driver status based on approval
+
             license_ok = webhook_data.get("license_approved", False)
             id_ok = webhook_data.get("id_document_approved", False)
-            
-            if license_ok and id_ok:
-                driver.approval_status = "approved"
-            else:
-                driver.approval_status = "rejected"
-            
+
+            # Update the latest approval record in place; the subquery
+            # replaces a separate SELECT ... ORDER BY ... LIMIT 1 roundtrip
+            latest_approval_id = (
+                select(DocumentApproval.id)
+                .where(DocumentApproval.driver_id == driver_id)
+                .order_by(DocumentApproval.sent_at.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            db.execute(
+                update(DocumentApproval)
+                .where(DocumentApproval.id == latest_approval_id)
+                .values(
+                    license_approved=license_ok,
+                    id_document_approved=id_ok,
+                    notes=webhook_data.get("notes", ""),
+                    processed_at=func.now()
+                )
+            )
+
+            # Update driver status based on approval, without loading the row
+            new_status = ApprovalStatus.APPROVED if license_ok and id_ok else ApprovalStatus.REJECTED
+            result = db.execute(
+                update(Driver).where(Driver.id == driver_id).values(approval_status=new_status)
+            )
+
+            if result.rowcount == 0:
+                # Unknown driver
+                db.rollback()
+                return False
+
             db.commit()
             return True
-            
+
         except Exception as e:
             print(f"Error processing approval webhook: {e}")
             db.rollback()
             return False
-
-# Global external API service instance
-external_api_service = ExternalAPIService()
\ No newline at end of file
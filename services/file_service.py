@@ -1,10 +1,16 @@
 import os
 import uuid
+import aiofiles
 import filetype
 from fastapi import UploadFile, HTTPException
 from typing import Optional, Tuple
 from config import UPLOAD_DIR, MAX_FILE_SIZE, ALLOWED_DOCUMENT_TYPES
 
+# Chunk size for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
+# Magic-byte sniffing only needs the first few hundred bytes
+SNIFF_HEADER_SIZE = 512
+
 class FileService:
     def __init__(self):
         self.upload_dir = UPLOAD_DIR
@@ -33,25 +39,42 @@ class FileService:
         unique_filename = f"{prefix}_{uuid.uuid4()}{file_extension}"
         file_path = os.path.join(self.upload_dir, unique_filename)
         
-        # Save file
+        # Stream the upload to disk in chunks instead of buffering the
+        # whole file in memory; enforce MAX_FILE_SIZE as bytes arrive
         try:
-            content = await file.read()
-            
-            # Additional validation using file content
-            kind = filetype.guess(content)
-            if kind is None and file_extension not in ['.pdf']:
-                raise HTTPException(status_code=400, detail="Could not determine file type")
-            
-            # For images, validate that it's actually an image
-            if file_extension in ['.jpg', '.jpeg', '.png'] and kind is not None:
-                if not kind.mime.startswith('image/'):
-                    raise HTTPException(status_code=400, detail="File is not a valid image")
-            
-            with open(file_path, 'wb') as f:
-                f.write(content)
-            
+            total_size = 0
+            first_chunk = True
+
+            async with aiofiles.open(file_path, 'wb') as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    if first_chunk:
+                        # filetype only needs the header bytes to sniff;
+                        # for image extensions run just the image matchers
+                        # instead of the full matcher table
+                        header = chunk[:SNIFF_HEADER_SIZE]
+                        if file_extension in ['.jpg', '.jpeg', '.png']:
+                            if filetype.image_match(header) is None:
+                                raise HTTPException(status_code=400, detail="File is not a valid image")
+                        elif file_extension not in ['.pdf']:
+                            if filetype.guess(header) is None:
+                                raise HTTPException(status_code=400, detail="Could not determine file type")
+                        first_chunk = False
+
+                    total_size += len(chunk)
+                    if total_size > MAX_FILE_SIZE:
+                        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024*1024):.1f}MB")
+
+                    await f.write(chunk)
+
+            if first_chunk:
+                raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
             return unique_filename
-            
+
+        except HTTPException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
         except Exception as e:
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -76,6 +99,3 @@ class FileService:
         """Check if file exists"""
         file_path = os.path.join(self.upload_dir, filename)
         return os.path.exists(file_path)
-
-# Global file service instance
-file_service = FileService()
\ No newline at end of file
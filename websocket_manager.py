@@ -1,89 +1,267 @@
-import json
 import asyncio
+import base64
+import hashlib
+import logging
+import time
+import zlib
+import orjson
+from cachetools import TTLCache
+from jose import jwt
 from typing import Dict, List, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from models import Driver, User
-from schemas import OrderNotificationWS
+from models import ApprovalStatus, Driver, User, UserType
+from pydantic import TypeAdapter, ValidationError
+from schemas import DriverMessageWS, OrderNotificationWS
 from auth import verify_token
 from database import SessionLocal
 
+# Handlers are typically off above DEBUG in production, and %s-style
+# lazy formatting means disabled records cost one level check
+log = logging.getLogger(__name__)
+
+# Large fan-outs are gathered in slices this big, yielding to the event
+# loop between slices so broadcasts don't starve unrelated handlers
+BROADCAST_BATCH_SIZE = 50
+
+# Per-connection outbound queue depth; on overflow the oldest frame is
+# dropped so one stalled client can't grow memory without bound
+SEND_QUEUE_MAXSIZE = 256
+
+# A client that dies without a close frame would otherwise linger in
+# active_connections until the next send fails; the reaper pings every
+# entry on this interval and evicts the ones that error
+REAPER_INTERVAL_SECONDS = 60
+_PING_PAYLOAD = b'{"type":"ping"}'
+
+# Location frames arriving closer together than this (seconds) are
+# dropped per driver; intermediate positions are superseded anyway
+LOCATION_UPDATE_MIN_INTERVAL = 0.5
+
+# Broadcast payloads above this size are deflated once and shared, so N
+# recipients cost one compression instead of per-connection deflate
+# re-compressing identical bytes N times
+COMPRESS_MIN_BYTES = 512
+
+# One pydantic-core pass parses and validates an incoming frame, instead
+# of orjson.loads followed by untyped dict.get probing
+_MESSAGE_ADAPTER = TypeAdapter(DriverMessageWS)
+
+# Fixed-shape prefix for the most frequent outbound message; only the
+# variable fields get encoded per call
+_STATUS_PREFIX = b'{"type":"order_status_update","data":{"order_id":'
+
+def _compress_payload(payload: bytes) -> bytes:
+    """Wrap a large payload in a compressed envelope, deflated exactly once"""
+    if len(payload) <= COMPRESS_MIN_BYTES:
+        return payload
+    return orjson.dumps({
+        "type": "compressed",
+        "encoding": "deflate+base64",
+        "data": base64.b64encode(zlib.compress(payload, 1)).decode()
+    })
+
 class ConnectionManager:
+    # Fixed attribute set: no per-instance __dict__, and typos on the
+    # per-connection state dicts fail loudly instead of creating orphans
+    __slots__ = (
+        "active_connections",
+        "_send_queues",
+        "_writer_tasks",
+        "_last_location_ts",
+        "_reaper_task",
+    )
+
     def __init__(self):
         self.active_connections: Dict[int, WebSocket] = {}  # driver_id: websocket
-        self.driver_connections: Dict[WebSocket, int] = {}  # websocket: driver_id
-        
+        self._send_queues: Dict[int, asyncio.Queue] = {}  # driver_id: outbound frames
+        self._writer_tasks: Dict[int, asyncio.Task] = {}
+        self._last_location_ts: Dict[int, float] = {}  # driver_id: monotonic time
+        self._reaper_task: Optional[asyncio.Task] = None
+
     async def connect(self, websocket: WebSocket, driver_id: int):
         """Accept a WebSocket connection for a driver"""
         await websocket.accept()
+
+        # A reconnecting driver replaces their previous connection: tear
+        # its writer and queue down here, because once the mapping points
+        # at the new socket the old one's disconnect() is a guarded no-op
+        # and would leak a writer blocked on an abandoned queue
+        old_task = self._writer_tasks.pop(driver_id, None)
+        if old_task is not None:
+            old_task.cancel()
+        self._send_queues.pop(driver_id, None)
+
+        # The socket carries its own driver_id, so one dict covers both
+        # lookup directions without hashing WebSocket objects
+        websocket.state.driver_id = driver_id
         self.active_connections[driver_id] = websocket
-        self.driver_connections[websocket] = driver_id
-        print(f"Driver {driver_id} connected via WebSocket")
-        
+
+        # One long-lived writer per connection drains an outbound queue,
+        # so producers never block on a backpressured socket
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_MAXSIZE)
+        self._send_queues[driver_id] = queue
+        self._writer_tasks[driver_id] = asyncio.create_task(
+            self._writer(driver_id, websocket, queue)
+        )
+        # Started lazily on first connect because __init__ runs at import
+        # time, before there is an event loop
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap_stale_connections())
+
+        log.debug("Driver %s connected via WebSocket", driver_id)
+
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection"""
-        if websocket in self.driver_connections:
-            driver_id = self.driver_connections[websocket]
-            del self.active_connections[driver_id]
-            del self.driver_connections[websocket]
-            print(f"Driver {driver_id} disconnected from WebSocket")
-    
+        driver_id = getattr(websocket.state, "driver_id", None)
+        # Only drop the entry if this socket still owns it, so a stale
+        # disconnect can't evict a driver's newer connection
+        if driver_id is None or self.active_connections.get(driver_id) is not websocket:
+            return
+        del self.active_connections[driver_id]
+        self._send_queues.pop(driver_id, None)
+        self._last_location_ts.pop(driver_id, None)
+        task = self._writer_tasks.pop(driver_id, None)
+        if task is not None:
+            task.cancel()
+        log.debug("Driver %s disconnected from WebSocket", driver_id)
+
+    async def _writer(self, driver_id: int, websocket: WebSocket, queue: asyncio.Queue):
+        """Drain one driver's outbound queue onto their socket"""
+        try:
+            while True:
+                payload = await queue.get()
+
+                # Coalesce whatever else is already queued into a single
+                # frame: one frame construction and one syscall for the
+                # whole burst instead of one per message
+                batch = [payload]
+                while True:
+                    try:
+                        batch.append(queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                if len(batch) > 1:
+                    # Each entry is already-encoded JSON, so the batch
+                    # envelope is a byte join, not a re-serialization.
+                    # Clients unpack {"type": "batch"} by iterating items
+                    payload = b'{"type":"batch","items":[' + b",".join(batch) + b"]}"
+
+                # orjson returns bytes, so send_bytes skips Starlette's
+                # extra UTF-8 encode of a text frame
+                await websocket.send_bytes(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Error sending message to driver %s: %s", driver_id, e)
+            # Remove the connection if it's broken
+            self.disconnect(websocket)
+
+    def throttle_location_update(self, driver_id: int) -> bool:
+        """True if this driver's location frame arrived too soon and should be dropped"""
+        now = asyncio.get_running_loop().time()
+        last = self._last_location_ts.get(driver_id)
+        if last is not None and now - last < LOCATION_UPDATE_MIN_INTERVAL:
+            return True
+        self._last_location_ts[driver_id] = now
+        return False
+
+    async def _reap_stale_connections(self):
+        """Periodically ping every connection, evicting the ones that error"""
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+            # Snapshot: disconnect mutates the mapping mid-iteration
+            for driver_id, websocket in list(self.active_connections.items()):
+                try:
+                    await websocket.send_bytes(_PING_PAYLOAD)
+                except Exception:
+                    log.debug("Reaping dead connection for driver %s", driver_id)
+                    self.disconnect(websocket)
+
+    @staticmethod
+    def _enqueue(queue: asyncio.Queue, payload: bytes):
+        """Enqueue a frame, dropping the oldest one when the client is stalled"""
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(payload)
+
+    def _send_bytes(self, driver_id: int, payload: bytes) -> bool:
+        """Queue a pre-serialized frame for one driver's writer task"""
+        queue = self._send_queues.get(driver_id)
+        if queue is None:
+            return False
+        self._enqueue(queue, payload)
+        return True
+
     async def send_personal_message(self, message: dict, driver_id: int):
         """Send a message to a specific driver"""
-        if driver_id in self.active_connections:
-            websocket = self.active_connections[driver_id]
-            try:
-                await websocket.send_text(json.dumps(message))
-                return True
-            except Exception as e:
-                print(f"Error sending message to driver {driver_id}: {e}")
-                # Remove the connection if it's broken
-                self.disconnect(websocket)
-                return False
-        return False
-    
+        return self._send_bytes(driver_id, orjson.dumps(message))
+
     async def notify_drivers_about_order(self, driver_ids: List[int], order_notification: OrderNotificationWS):
-        """Notify multiple drivers about a new order"""
-        successful_notifications = []
-        
-        message = {
+        """Notify multiple drivers about a new order concurrently"""
+        # Serialize once; every recipient gets the same bytes instead of
+        # paying one dumps per driver. model_dump goes through
+        # pydantic-core rather than the deprecated Python-level .dict()
+        payload = _compress_payload(orjson.dumps({
             "type": "order_notification",
-            "data": order_notification.dict()
-        }
-        
-        for driver_id in driver_ids:
-            success = await self.send_personal_message(message, driver_id)
-            if success:
-                successful_notifications.append(driver_id)
-        
-        return successful_notifications
+            "data": order_notification.model_dump(mode="json")
+        }))
+
+        # Enqueueing is non-blocking, so the fan-out completes without
+        # waiting on any socket; the writer tasks race the actual sends
+        return [
+            driver_id
+            for driver_id in driver_ids
+            if self._send_bytes(driver_id, payload)
+        ]
     
     async def send_order_status_update(self, driver_id: int, order_id: int, status: str, message: str = ""):
         """Send order status update to a driver"""
-        message_data = {
-            "type": "order_status_update",
-            "data": {
-                "order_id": order_id,
-                "status": status,
-                "message": message
-            }
-        }
-        return await self.send_personal_message(message_data, driver_id)
+        # Compose the frame from the fixed template: no envelope dict and
+        # no generic JSON walk. The string fields still go through orjson
+        # so escaping stays correct
+        payload = (
+            _STATUS_PREFIX + str(order_id).encode()
+            + b',"status":' + orjson.dumps(status)
+            + b',"message":' + orjson.dumps(message)
+            + b"}}"
+        )
+        return self._send_bytes(driver_id, payload)
     
     async def broadcast_to_available_drivers(self, message: dict, driver_ids: List[int] = None):
         """Broadcast a message to all available drivers or specific driver list"""
+        payload = _compress_payload(orjson.dumps(message))
+
         if driver_ids is None:
-            # Send to all connected drivers
-            target_drivers = list(self.active_connections.keys())
+            # All connected drivers: walk the queue mapping once instead
+            # of materializing an id list and re-looking each id up.
+            # Snapshotted because writer-task disconnects can mutate it
+            # across the yields below
+            targets = list(self._send_queues.items())
         else:
-            target_drivers = driver_ids
-        
+            targets = [
+                (driver_id, queue)
+                for driver_id in driver_ids
+                if (queue := self._send_queues.get(driver_id)) is not None
+            ]
+
+        # Enqueueing is cheap pure-CPU work, but a huge broadcast is still
+        # worth slicing so the loop gets a turn between batches
         successful_sends = []
-        for driver_id in target_drivers:
-            success = await self.send_personal_message(message, driver_id)
-            if success:
+        for i in range(0, len(targets), BROADCAST_BATCH_SIZE):
+            for driver_id, queue in targets[i:i + BROADCAST_BATCH_SIZE]:
+                self._enqueue(queue, payload)
                 successful_sends.append(driver_id)
-        
+            # Sends that fit in one batch keep the old behavior; bigger
+            # ones give the loop a turn between slices
+            if i + BROADCAST_BATCH_SIZE < len(targets):
+                await asyncio.sleep(0)
+
         return successful_sends
     
     def get_connected_drivers(self) -> List[int]:
@@ -97,39 +275,87 @@ class ConnectionManager:
 # Global connection manager instance
 manager = ConnectionManager()
 
+# Mobile clients reconnect constantly on network flaps, re-presenting
+# the same JWT. Cache token -> (driver_id, exp) so a reconnect skips the
+# signature check and the DB; hits past the token's exp are rejected,
+# and the TTL bounds how long a deactivation or approval change can go
+# unnoticed. Keyed by digest, not the raw token
+_auth_cache: TTLCache = TTLCache(maxsize=10000, ttl=300)
+
+def _authorize_driver(email: str):
+    """
+    Resolve an authenticated email to an approved driver's id.
+    Returns (driver_id, None) on success, (None, reason) on failure.
+    Synchronous DB work, meant to run in the threadpool.
+    """
+    db = SessionLocal()
+    try:
+        # One JOIN query instead of sequential User then Driver lookups;
+        # outer join so the distinct rejection reasons survive
+        row = (
+            db.query(User, Driver)
+            .outerjoin(Driver, Driver.user_id == User.id)
+            .filter(User.email == email)
+            .first()
+        )
+        if row is None:
+            return None, "User not found or inactive"
+
+        user, driver = row
+        if not bool(user.is_active):
+            return None, "User not found or inactive"
+        # Compare enum members, not str(): str(UserType.DRIVER) is
+        # 'UserType.DRIVER', so the old string checks never matched
+        if user.user_type != UserType.DRIVER:
+            return None, "Only drivers can connect via WebSocket"
+        if driver is None or driver.approval_status != ApprovalStatus.APPROVED:
+            return None, "Driver not approved"
+
+        return int(driver.id), None
+    finally:
+        db.close()
+
 async def authenticate_websocket(websocket: WebSocket, token: str) -> Optional[int]:
     """Authenticate WebSocket connection and return driver_id"""
     try:
-        # Verify JWT token
-        email = verify_token(token)
+        token_digest = hashlib.sha256(token.encode()).digest()
+        cached = _auth_cache.get(token_digest)
+        if cached is not None:
+            driver_id, exp = cached
+            # The signature was verified when the entry was written; the
+            # expiry still has to hold on every hit
+            if exp is None or exp > time.time():
+                return driver_id
+            # Token expired inside the cache TTL: drop the entry and fall
+            # through to the full check, which will reject it
+            _auth_cache.pop(token_digest, None)
+
+        # Signature verification is pure CPU; run it in the threadpool so
+        # a connection surge doesn't serialize accepts on the event loop
+        email = await run_in_threadpool(verify_token, token)
         if not email:
             await websocket.close(code=1008, reason="Invalid token")
             return None
-        
-        # Get user and driver information
-        db = SessionLocal()
+
+        # Pooled sync session in the threadpool: the lookup doesn't block
+        # the event loop during a connection storm
+        driver_id, failure_reason = await run_in_threadpool(_authorize_driver, email)
+        if driver_id is None:
+            await websocket.close(code=1008, reason=failure_reason)
+            return None
+
+        # Claims are safe to read unverified here: the signature on this
+        # exact token was just checked above
         try:
-            user = db.query(User).filter(User.email == email).first()
-            if not user or not bool(user.is_active):
-                await websocket.close(code=1008, reason="User not found or inactive")
-                return None
-            
-            if str(user.user_type) != "driver":
-                await websocket.close(code=1008, reason="Only drivers can connect via WebSocket")
-                return None
-            
-            driver = db.query(Driver).filter(Driver.user_id == user.id).first()
-            if not driver or str(driver.approval_status) != "approved":
-                await websocket.close(code=1008, reason="Driver not approved")
-                return None
-            
-            return int(driver.id)
-            
-        finally:
-            db.close()
-    
+            exp = jwt.get_unverified_claims(token).get("exp")
+        except Exception:
+            exp = None
+
+        _auth_cache[token_digest] = (driver_id, exp)
+        return driver_id
+
     except Exception as e:
-        print(f"WebSocket authentication error: {e}")
+        log.warning("WebSocket authentication error: %s", e)
         await websocket.close(code=1011, reason="Authentication error")
         return None
 
@@ -143,46 +369,57 @@ async def handle_websocket_connection(websocket: WebSocket, token: str):
     await manager.connect(websocket, driver_id)
     
     try:
-        while True:
-            # Listen for messages from the driver
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
+        # iter_text handles the disconnect close frame itself, ending the
+        # iteration instead of raising through our loop
+        async for data in websocket.iter_text():
+            try:
+                message = _MESSAGE_ADAPTER.validate_json(data)
+            except ValidationError:
+                # Malformed frames are dropped instead of tearing the
+                # connection down
+                log.debug("Dropping malformed message from driver %s", driver_id)
+                continue
+
             # Handle different message types
             await handle_driver_message(driver_id, message)
-            
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+
     except Exception as e:
-        print(f"WebSocket error for driver {driver_id}: {e}")
+        log.warning("WebSocket error for driver %s: %s", driver_id, e)
+    finally:
+        # Cleanup runs on clean close, error, and cancellation alike
         manager.disconnect(websocket)
 
-async def handle_driver_message(driver_id: int, message: dict):
+async def handle_driver_message(driver_id: int, message: DriverMessageWS):
     """Handle messages sent by drivers through WebSocket"""
-    message_type = message.get("type")
-    
-    if message_type == "order_response":
-        # Handle order acceptance/rejection
-        await handle_order_response(driver_id, message.get("data", {}))
-    elif message_type == "status_update":
-        # Handle driver status updates
-        await handle_driver_status_update(driver_id, message.get("data", {}))
-    elif message_type == "location_update":
-        # Handle location updates
-        await handle_location_update(driver_id, message.get("data", {}))
+    # Sample the hottest message type before any handler work: clients
+    # report positions at several Hz, far faster than anyone consumes them
+    if message.type == "location_update" and manager.throttle_location_update(driver_id):
+        return
+
+    handler = _HANDLERS.get(message.type)
+    if handler is not None:
+        await handler(driver_id, message.data)
 
 async def handle_order_response(driver_id: int, data: dict):
     """Handle order acceptance or rejection from driver"""
     # This will be implemented in the main application logic
     # For now, just log the response
-    print(f"Driver {driver_id} responded to order: {data}")
+    log.debug("Driver %s responded to order: %s", driver_id, data)
 
 async def handle_driver_status_update(driver_id: int, data: dict):
     """Handle driver status updates"""
     # This will be implemented in the main application logic
-    print(f"Driver {driver_id} status update: {data}")
+    log.debug("Driver %s status update: %s", driver_id, data)
 
 async def handle_location_update(driver_id: int, data: dict):
     """Handle driver location updates"""
     # This will be implemented in the main application logic
-    print(f"Driver {driver_id} location update: {data}")
\ No newline at end of file
+    log.debug("Driver %s location update: %s", driver_id, data)
+
+# Message-type dispatch table: one dict lookup per message instead of an
+# if/elif ladder, which matters at location-update frequencies
+_HANDLERS = {
+    "order_response": handle_order_response,
+    "status_update": handle_driver_status_update,
+    "location_update": handle_location_update,
+}
\ No newline at end of file